@@ -1,14 +1,112 @@
-"""Historical data provider for market data using Polygon.io API."""
+"""Historical data provider for market data using Polygon.io API.
+
+pandas, numpy and the Polygon client are imported lazily where they are used, so importing this module alone (e.g.
+to read ``HistoricalDataProviderConfig``) does not load them. Constructing a provider loads the Polygon client, and
+any data access, including cache hits, loads pandas.
+"""
+
+from __future__ import annotations
 
 import hashlib
+import operator
+import threading
+import uuid
+from collections import OrderedDict
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import ClassVar
+from typing import TYPE_CHECKING, Annotated, Any, ClassVar
 
-import pandas as pd
 from loguru import logger
-from polygon import RESTClient  # type: ignore[import-untyped]
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Aggregate record fields in DataFrame column order; Polygon may omit vwap/transactions, so transactions are
+# stored as float64 to hold NaN
+_AGG_FIELD_DTYPES: dict[str, str] = {
+    "open": "f8",
+    "high": "f8",
+    "low": "f8",
+    "close": "f8",
+    "volume": "f8",
+    "vwap": "f8",
+    "timestamp": "i8",
+    "transactions": "f8",
+}
+_INT32_MAX = 2**31 - 1
+
+# Default number of concurrent fetches, and connections kept per host by the shared Polygon clients
+_DEFAULT_MAX_WORKERS = 8
+
+# Polygon clients shared across provider instances, keyed by API key
+_POLYGON_CLIENTS: dict[str, Any] = {}
+_POLYGON_CLIENTS_LOCK = threading.Lock()
+
+
+def _get_polygon_client(api_key: str) -> Any:
+    """Get the shared Polygon client for an API key, creating it on first use.
+
+    Reusing one client lets provider instances share its HTTP connection pool. New clients keep up to
+    ``_DEFAULT_MAX_WORKERS`` connections per host, so that many concurrent requests reuse keep-alive connections;
+    ``get_historical_data_many`` grows the pool when called with more workers.
+
+    Args:
+        api_key: Polygon.io API key
+
+    Returns:
+        Polygon RESTClient for the API key
+    """
+    with _POLYGON_CLIENTS_LOCK:
+        client = _POLYGON_CLIENTS.get(api_key)
+        if client is None:
+            from polygon import RESTClient  # type: ignore[import-untyped]  # noqa: PLC0415
+
+            client = _POLYGON_CLIENTS[api_key] = RESTClient(api_key)
+    _ensure_connection_pool_size(client, _DEFAULT_MAX_WORKERS)
+    return client
+
+
+def _ensure_connection_pool_size(client: Any, size: int) -> None:
+    """Make sure a Polygon client keeps at least ``size`` connections per host.
+
+    urllib3 keeps a single connection per host by default, so concurrent requests through a shared client would
+    discard all but one connection and re-open (re-handshake) the others on every request. Pools are keyed by
+    their settings, so pools created after this call use the new size.
+
+    Args:
+        client: Polygon RESTClient
+        size: Minimum number of connections to keep per host
+    """
+    pool_kwargs = getattr(getattr(client, "client", None), "connection_pool_kw", None)
+    if not isinstance(pool_kwargs, dict):
+        return
+    with _POLYGON_CLIENTS_LOCK:
+        if pool_kwargs.get("maxsize", 1) < size:
+            pool_kwargs["maxsize"] = size
+
+
+def _isolated_copy(df: pd.DataFrame) -> pd.DataFrame:
+    """Copy a DataFrame so that modifying the copy never affects the original.
+
+    With pandas Copy-on-Write (always on since pandas 3, opt-in via the ``mode.copy_on_write`` option before)
+    a shallow copy is enough: the data buffers are shared and only copied when either side is modified.
+    Otherwise a deep copy is needed.
+
+    Args:
+        df: DataFrame to copy
+
+    Returns:
+        Copy of the DataFrame
+    """
+    import pandas as pd  # noqa: PLC0415
+
+    copy_on_write = int(pd.__version__.split(".", 1)[0]) >= 3 or pd.get_option("mode.copy_on_write") is True  # noqa: PLR2004
+    return df.copy(deep=not copy_on_write)
+
 
 class HistoricalDataProviderConfig(BaseSettings):
     """Configuration for HistoricalDataProvider."""
@@ -18,6 +116,8 @@ class HistoricalDataProviderConfig(BaseSettings):
     polygon_api_key: str
     cache_dir: Path = Path(".cache/historical_data")
     use_cache: bool = True
+    memory_cache_size: Annotated[int, Field(ge=0)] = 32
+    feather_row_threshold: Annotated[int, Field(ge=0)] = 1000
 
     model_config = SettingsConfigDict(
         env_prefix=ENV_COMMON_PREFIX,
@@ -37,7 +137,9 @@ class HistoricalDataProvider:
         """
         self.config = config if config is not None else HistoricalDataProviderConfig()  # type: ignore[call-arg]
         logger.debug("Initializing HistoricalDataProvider with config={config}", config=self.config)
-        self.polygon_client = RESTClient(self.config.polygon_api_key)
+        self.polygon_client = _get_polygon_client(self.config.polygon_api_key)
+        self._memory_cache: OrderedDict[str, pd.DataFrame] = OrderedDict()
+        self._memory_cache_lock = threading.Lock()
 
         # Create cache directory if it doesn't exist
         if self.config.use_cache:
@@ -73,18 +175,150 @@ class HistoricalDataProvider:
             Hash string to use as cache key
         """
         key_parts = f"{ticker}_{multiplier}_{timespan}_{from_date}_{to_date}_{adjusted}_{sort}_{limit}"
-        return hashlib.sha256(key_parts.encode()).hexdigest()
+        return hashlib.blake2b(key_parts.encode(), digest_size=16).hexdigest()
 
-    def _get_cache_path(self, cache_key: str) -> Path:
+    def _get_cache_path(self, cache_key: str, suffix: str = ".parquet") -> Path:
         """Get the full path for a cache file.
 
+        Cache files are sharded into subdirectories named after the first two hex characters of the key, which
+        keeps the number of entries per directory small as the cache grows.
+
         Args:
             cache_key: The cache key hash
+            suffix: File suffix selecting the cache format (".parquet" or ".feather")
 
         Returns:
             Path object for the cache file
         """
-        return self.config.cache_dir / f"{cache_key}.parquet"
+        return self.config.cache_dir / cache_key[:2] / f"{cache_key}{suffix}"
+
+    def _read_cache_file(self, cache_key: str) -> pd.DataFrame | None:
+        """Read a DataFrame from the on-disk cache, trying the Feather and then the parquet cache file.
+
+        Args:
+            cache_key: The cache key hash
+
+        Returns:
+            The cached DataFrame, or None if it is not cached
+        """
+        import pandas as pd  # noqa: PLC0415
+
+        feather_path = self._get_cache_path(cache_key, ".feather")
+        parquet_path = self._get_cache_path(cache_key)
+        if feather_path.exists():
+            logger.debug("Loading data from cache: {cache_path}", cache_path=feather_path)
+            df = pd.read_feather(feather_path)
+        elif parquet_path.exists():
+            logger.debug("Loading data from cache: {cache_path}", cache_path=parquet_path)
+            df = pd.read_parquet(parquet_path, engine="pyarrow")
+        else:
+            return None
+
+        # Widen transaction counts stored as int32 by _write_cache_file back to Int64
+        df["transactions"] = df["transactions"].astype("Int64")
+        return df
+
+    def _write_cache_file(self, df: pd.DataFrame, cache_key: str) -> Path:
+        """Atomically write a DataFrame to the on-disk cache.
+
+        Responses with fewer than feather_row_threshold rows are stored as uncompressed Feather (Arrow IPC),
+        which avoids parquet's fixed encode/decode cost for tiny files; larger ones as zstd-compressed parquet.
+        The data is written to a uniquely named temporary file next to the cache file and then renamed into
+        place, so readers never see a partially written file and concurrent writers do not clobber each other.
+        Transaction counts are stored as int32 when they fit, halving that column on disk.
+
+        Args:
+            df: DataFrame to write
+            cache_key: The cache key hash
+
+        Returns:
+            Path of the written cache file
+        """
+        if not (df["transactions"] > _INT32_MAX).any():
+            # Replace the column on a shallow copy so the caller's DataFrame keeps its Int64 column
+            df = df.copy(deep=False)
+            df["transactions"] = df["transactions"].astype("Int32")
+
+        use_feather = len(df) < self.config.feather_row_threshold
+        cache_path = self._get_cache_path(cache_key, ".feather" if use_feather else ".parquet")
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            if use_feather:
+                df.to_feather(tmp_path, compression="uncompressed")
+            else:
+                df.to_parquet(tmp_path, engine="pyarrow", compression="zstd")
+            tmp_path.replace(cache_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return cache_path
+
+    def _get_from_memory_cache(self, cache_key: str) -> pd.DataFrame | None:
+        """Look up a DataFrame in the in-memory cache and mark it as most recently used.
+
+        Args:
+            cache_key: The cache key hash
+
+        Returns:
+            Copy of the cached DataFrame, or None if it is not cached
+        """
+        with self._memory_cache_lock:
+            df = self._memory_cache.get(cache_key)
+            if df is None:
+                return None
+            self._memory_cache.move_to_end(cache_key)
+        return _isolated_copy(df)
+
+    def _add_to_memory_cache(self, cache_key: str, df: pd.DataFrame) -> None:
+        """Store a copy of a DataFrame in the in-memory cache, evicting the least recently used entries.
+
+        The stored copy is always deep: a shallow one would share buffers with the caller's DataFrame, which
+        pandas only protects while Copy-on-Write stays enabled. Storing follows a disk read or an API fetch, so the
+        copy is cheap in comparison.
+
+        Args:
+            cache_key: The cache key hash
+            df: DataFrame to cache
+        """
+        if self.config.memory_cache_size == 0:
+            return
+        df = df.copy()
+        with self._memory_cache_lock:
+            self._memory_cache[cache_key] = df
+            self._memory_cache.move_to_end(cache_key)
+            while len(self._memory_cache) > self.config.memory_cache_size:
+                self._memory_cache.popitem(last=False)
+
+    @staticmethod
+    def _aggs_to_dataframe(aggs: Iterable[Any]) -> pd.DataFrame:
+        """Build a DataFrame from Polygon aggregates in a single pass.
+
+        Args:
+            aggs: Iterable of Polygon aggregate objects
+
+        Returns:
+            DataFrame with columns: open, high, low, close, volume, vwap, timestamp, transactions
+        """
+        import numpy as np  # noqa: PLC0415
+        import pandas as pd  # noqa: PLC0415
+
+        # Stream aggregates straight into one structured array: attrgetter fetches all fields of an aggregate
+        # in a single call and np.fromiter fills (and grows) the contiguous record buffer in C
+        get_fields = operator.attrgetter(*_AGG_FIELD_DTYPES)
+        records = np.fromiter(map(get_fields, aggs), dtype=np.dtype(list(_AGG_FIELD_DTYPES.items())))
+
+        logger.debug("Retrieved {count} aggregates", count=len(records))
+
+        # Reinterpret the epoch milliseconds as datetime64[ms] in place: no per-row Timestamp objects and no
+        # upcast to nanoseconds
+        columns: dict[str, Any] = {name: records[name] for name in _AGG_FIELD_DTYPES}
+        columns["timestamp"] = pd.DatetimeIndex(records["timestamp"].view("datetime64[ms]"), tz="UTC")
+
+        # Keep 64-bit columns so arithmetic on them cannot wrap around: volume stays float64 (Polygon reports
+        # fractional volumes) and transaction counts become nullable Int64; the cache stores them narrower
+        columns["transactions"] = pd.array(records["transactions"], dtype="Int64")
+
+        return pd.DataFrame(columns)
 
     def get_historical_data(  # noqa: PLR0913
         self,
@@ -137,53 +371,94 @@ class HistoricalDataProvider:
                 sort=sort,
                 limit=limit,
             )
-            cache_path = self._get_cache_path(cache_key)
 
-            if cache_path.exists():
-                logger.debug("Loading data from cache: {cache_path}", cache_path=cache_path)
-                df = pd.read_parquet(cache_path)
+            cached_df = self._get_from_memory_cache(cache_key)
+            if cached_df is not None:
+                logger.debug("Loaded {rows} rows from memory cache", rows=len(cached_df))
+                return cached_df
+
+            df = self._read_cache_file(cache_key)
+            if df is not None:
                 logger.debug("Loaded {rows} rows from cache", rows=len(df))
+                self._add_to_memory_cache(cache_key, df)
                 return df
 
             logger.debug("Cache miss, fetching from API")
 
         # Fetch from API
-        aggs = []
-        for agg in self.polygon_client.list_aggs(
-            ticker=ticker,
-            multiplier=multiplier,
-            timespan=timespan,
-            from_=from_date,
-            to=to_date,
-            adjusted=str(adjusted).lower(),
-            sort=sort,
-            limit=limit,
-        ):
-            aggs.append(agg)
-
-        logger.debug("Retrieved {count} aggregates", count=len(aggs))
-
-        df = pd.DataFrame(
-            [
-                {
-                    "open": agg.open,
-                    "high": agg.high,
-                    "low": agg.low,
-                    "close": agg.close,
-                    "volume": agg.volume,
-                    "vwap": agg.vwap,
-                    "timestamp": pd.to_datetime(agg.timestamp, unit="ms", utc=True),
-                    "transactions": agg.transactions,
-                }
-                for agg in aggs
-            ]
+        df = self._aggs_to_dataframe(
+            self.polygon_client.list_aggs(
+                ticker=ticker,
+                multiplier=multiplier,
+                timespan=timespan,
+                from_=from_date,
+                to=to_date,
+                adjusted=str(adjusted).lower(),
+                sort=sort,
+                limit=limit,
+            )
         )
 
         logger.debug("Created DataFrame with {rows} rows", rows=len(df))
 
         # Save to cache
         if self.config.use_cache:
-            df.to_parquet(cache_path)
+            cache_path = self._write_cache_file(df, cache_key)
             logger.debug("Saved data to cache: {cache_path}", cache_path=cache_path)
+            self._add_to_memory_cache(cache_key, df)
 
         return df
+
+    def get_historical_data_many(  # noqa: PLR0913
+        self,
+        tickers: Iterable[str],
+        multiplier: int,
+        timespan: str,
+        from_date: str,
+        to_date: str,
+        adjusted: bool = True,
+        sort: str = "asc",
+        limit: int = 50000,
+        max_workers: int = _DEFAULT_MAX_WORKERS,
+    ) -> dict[str, pd.DataFrame]:
+        """Retrieve historical market data for several tickers concurrently.
+
+        Requests are dispatched to a thread pool sharing the same Polygon client, so the network I/O of
+        different tickers overlaps. Each ticker goes through get_historical_data, including caching.
+
+        Args:
+            tickers: Stock ticker symbols (e.g., ["AAPL", "GOOGL"]); duplicates are fetched once
+            multiplier: Size of the time window (e.g., 1 for 1 minute, 5 for 5 minutes)
+            timespan: Size of the time window (e.g., "minute", "hour", "day")
+            from_date: Start date in format "YYYY-MM-DD"
+            to_date: End date in format "YYYY-MM-DD"
+            adjusted: Whether to adjust for splits and dividends
+            sort: Sort order - "asc" or "desc"
+            limit: Maximum number of results to return per ticker
+            max_workers: Maximum number of concurrent requests
+
+        Returns:
+            Mapping of ticker to DataFrame, in the order the tickers were given
+        """
+        unique_tickers = list(dict.fromkeys(tickers))
+        logger.debug(
+            "Fetching historical data for {count} tickers with max_workers={max_workers}",
+            count=len(unique_tickers),
+            max_workers=max_workers,
+        )
+
+        _ensure_connection_pool_size(self.polygon_client, max_workers)
+        fetch = partial(
+            self.get_historical_data,
+            multiplier=multiplier,
+            timespan=timespan,
+            from_date=from_date,
+            to_date=to_date,
+            adjusted=adjusted,
+            sort=sort,
+            limit=limit,
+        )
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            frames = list(executor.map(fetch, unique_tickers))
+
+        return dict(zip(unique_tickers, frames, strict=True))
@@ -1,14 +1,49 @@
 """Tests for HistoricalDataProvider."""
 
+import logging
+import re
+import subprocess
+import sys
+from collections.abc import Callable, Iterator
 from pathlib import Path
 from unittest.mock import MagicMock
 
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq  # type: ignore[import-untyped]
 import pytest
+from polygon import RESTClient  # type: ignore[import-untyped]
+from pytest_httpserver import HTTPServer
+from pytest_mock import MockerFixture
 
 from metrix.historical_data_provider import HistoricalDataProvider, HistoricalDataProviderConfig
 
 
+def _cache_files(cache_dir: Path) -> list[Path]:
+    """List all files in a (sharded) cache directory."""
+    return [path for path in cache_dir.rglob("*") if path.is_file()]
+
+
+class TestModuleImport:
+    """Tests for importing metrix.historical_data_provider."""
+
+    def test_module_import_is_lazy(self) -> None:
+        """Test that importing the module does not import pandas, numpy or the Polygon client."""
+        code = (
+            "import sys; import metrix.historical_data_provider; "
+            "print(sorted(name for name in ('numpy', 'pandas', 'polygon') if name in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            check=True,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+
+        assert result.stdout.strip() == "[]"
+
+
 class TestHistoricalDataProviderConfig:
     """Tests for HistoricalDataProviderConfig."""
 
@@ -28,6 +63,8 @@ class TestHistoricalDataProviderConfig:
         config = HistoricalDataProviderConfig(polygon_api_key="test_key")
         assert config.use_cache is True
         assert config.cache_dir == Path(".cache/historical_data")
+        assert config.memory_cache_size == 32  # noqa: PLR2004
+        assert config.feather_row_threshold == 1000  # noqa: PLR2004
 
 
 class TestHistoricalDataProvider:
@@ -43,6 +80,44 @@ class TestHistoricalDataProvider:
         """Create a HistoricalDataProvider instance."""
         return HistoricalDataProvider(config=mock_config)
 
+    @pytest.fixture
+    def make_agg(self) -> Callable[..., MagicMock]:
+        """Provide a factory for mock Polygon aggregates with default values and per-field overrides."""
+
+        def _make_agg(**overrides: object) -> MagicMock:
+            fields: dict[str, object] = {
+                "open": 150.0,
+                "high": 152.0,
+                "low": 149.0,
+                "close": 151.0,
+                "volume": 1000000,
+                "vwap": 150.5,
+                "timestamp": 1609459200000,
+                "transactions": 100,
+            }
+            return MagicMock(**(fields | overrides))
+
+        return _make_agg
+
+    @pytest.fixture
+    def mock_client(self, provider: HistoricalDataProvider, make_agg: Callable[..., MagicMock]) -> MagicMock:
+        """Attach a mock Polygon client that returns a single aggregate on every call."""
+        mock_agg = make_agg()
+
+        mock_client = MagicMock()
+        mock_client.list_aggs.side_effect = lambda **_: iter([mock_agg])
+        provider.polygon_client = mock_client
+        return mock_client
+
+    @pytest.fixture
+    def threaded_httpserver(self) -> Iterator[HTTPServer]:
+        """Provide a running HTTP server that handles requests concurrently, like the plugin's httpserver."""
+        server = HTTPServer(threaded=True)
+        server.start()
+        yield server
+        server.clear()
+        server.stop()
+
     def test_init_with_config(self, mock_config: HistoricalDataProviderConfig) -> None:
         """Test initialization with explicit config."""
         provider = HistoricalDataProvider(config=mock_config)
@@ -56,6 +131,25 @@ class TestHistoricalDataProvider:
         assert provider.config.polygon_api_key == "env_key"
         assert provider.polygon_client is not None
 
+    def test_polygon_client_shared_per_api_key(self, tmp_path: Path) -> None:
+        """Test that providers with the same API key share one Polygon client."""
+        provider1 = HistoricalDataProvider(
+            config=HistoricalDataProviderConfig(polygon_api_key="shared_key", cache_dir=tmp_path / "cache1")
+        )
+        provider2 = HistoricalDataProvider(
+            config=HistoricalDataProviderConfig(polygon_api_key="shared_key", cache_dir=tmp_path / "cache2")
+        )
+        provider3 = HistoricalDataProvider(
+            config=HistoricalDataProviderConfig(polygon_api_key="other_key", cache_dir=tmp_path / "cache3")
+        )
+
+        assert provider1.polygon_client is provider2.polygon_client
+        assert provider1.polygon_client is not provider3.polygon_client
+
+    def test_polygon_client_keeps_multiple_connections(self, provider: HistoricalDataProvider) -> None:
+        """Test that the shared Polygon client keeps more than one connection per host."""
+        assert provider.polygon_client.client.connection_pool_kw["maxsize"] > 1
+
     def test_get_historical_data(self, provider: HistoricalDataProvider) -> None:
         """Test get_historical_data method."""
         # Create mock aggregates
@@ -126,6 +220,15 @@ class TestHistoricalDataProvider:
         assert df.iloc[1]["open"] == 151.0  # noqa: PLR2004
         assert df.iloc[1]["close"] == 152.0  # noqa: PLR2004
 
+        # Check timestamps are converted to UTC datetimes
+        assert str(df["timestamp"].dtype) == "datetime64[ms, UTC]"
+        assert df.iloc[0]["timestamp"] == pd.Timestamp("2021-01-01 00:00:00", tz="UTC")
+        assert df.iloc[1]["timestamp"] == pd.Timestamp("2021-01-01 00:10:00", tz="UTC")
+
+        # Check volume stays float64 and transaction counts are nullable Int64
+        assert df["volume"].dtype == "float64"
+        assert df["transactions"].dtype == "Int64"
+
     def test_get_historical_data_empty(self, provider: HistoricalDataProvider) -> None:
         """Test get_historical_data with no results."""
         mock_client = MagicMock()
@@ -143,6 +246,128 @@ class TestHistoricalDataProvider:
         assert isinstance(df, pd.DataFrame)
         assert len(df) == 0
 
+    def test_get_historical_data_missing_fields(
+        self, provider: HistoricalDataProvider, make_agg: Callable[..., MagicMock]
+    ) -> None:
+        """Test that aggregates without vwap/transactions produce missing values."""
+        mock_agg = make_agg(volume=1000000.5, vwap=None, transactions=None)
+
+        mock_client = MagicMock()
+        mock_client.list_aggs.return_value = iter([mock_agg])
+        provider.polygon_client = mock_client
+
+        df = provider.get_historical_data(
+            ticker="I:SPX",
+            multiplier=1,
+            timespan="day",
+            from_date="2021-01-01",
+            to_date="2021-01-02",
+        )
+
+        assert df.iloc[0]["volume"] == 1000000.5  # noqa: PLR2004
+        assert pd.isna(df.iloc[0]["vwap"])
+        assert pd.isna(df.iloc[0]["transactions"])
+        assert df["volume"].dtype == "float64"
+
+    def test_get_historical_data_large_counts(
+        self, provider: HistoricalDataProvider, make_agg: Callable[..., MagicMock]
+    ) -> None:
+        """Test that large volumes and transaction counts beyond int32 are kept exactly."""
+        mock_agg = make_agg(volume=12_000_000_000, transactions=3_000_000_000)
+
+        mock_client = MagicMock()
+        mock_client.list_aggs.return_value = iter([mock_agg])
+        provider.polygon_client = mock_client
+
+        df = provider.get_historical_data(
+            ticker="AAPL",
+            multiplier=1,
+            timespan="month",
+            from_date="2021-01-01",
+            to_date="2021-12-31",
+        )
+
+        assert df["volume"].dtype == "float64"
+        assert df.iloc[0]["volume"] == 12_000_000_000  # noqa: PLR2004
+        assert df["transactions"].dtype == "Int64"
+        assert df.iloc[0]["transactions"] == 3_000_000_000  # noqa: PLR2004
+
+    def test_get_historical_data_falling_volume_diff(
+        self, provider: HistoricalDataProvider, make_agg: Callable[..., MagicMock]
+    ) -> None:
+        """Test that volume differences can be negative (no unsigned wrap-around)."""
+        mock_client = MagicMock()
+        mock_client.list_aggs.return_value = iter(
+            [make_agg(volume=50_000_000), make_agg(volume=40_000_000, timestamp=1609545600000)]
+        )
+        provider.polygon_client = mock_client
+
+        df = provider.get_historical_data(
+            ticker="AAPL",
+            multiplier=1,
+            timespan="day",
+            from_date="2021-01-01",
+            to_date="2021-01-03",
+        )
+
+        assert df["volume"].diff().iloc[1] == -10_000_000  # noqa: PLR2004
+        assert (df["volume"] * 100).iloc[0] == 5_000_000_000  # noqa: PLR2004
+
+    def test_get_historical_data_transactions_arithmetic(
+        self,
+        provider: HistoricalDataProvider,
+        mock_config: HistoricalDataProviderConfig,
+        make_agg: Callable[..., MagicMock],
+    ) -> None:
+        """Test that transaction count arithmetic does not wrap around, also after a round trip through the cache."""
+        mock_client = MagicMock()
+        mock_client.list_aggs.return_value = iter(
+            [make_agg(transactions=30_000_000), make_agg(transactions=40_000_000, timestamp=1609545600000)]
+        )
+        provider.polygon_client = mock_client
+        df1 = provider.get_historical_data(
+            ticker="AAPL", multiplier=1, timespan="month", from_date="2021-01-01", to_date="2021-03-01"
+        )
+
+        new_provider = HistoricalDataProvider(config=mock_config)
+        new_provider.polygon_client = mock_client
+        df2 = new_provider.get_historical_data(
+            ticker="AAPL", multiplier=1, timespan="month", from_date="2021-01-01", to_date="2021-03-01"
+        )
+
+        assert mock_client.list_aggs.call_count == 1
+        for df in (df1, df2):
+            assert df["transactions"].dtype == "Int64"
+            assert list(df["transactions"] * 100) == [3_000_000_000, 4_000_000_000]
+            assert (df["transactions"] ** 2).iloc[0] == 900_000_000_000_000  # noqa: PLR2004
+        (cache_file,) = _cache_files(mock_config.cache_dir)
+        assert pd.read_feather(cache_file)["transactions"].dtype == "Int32"
+
+    def test_get_historical_data_exceeds_limit(
+        self, provider: HistoricalDataProvider, make_agg: Callable[..., MagicMock]
+    ) -> None:
+        """Test that paginated results larger than the per-page limit are all kept."""
+        mock_aggs = [
+            make_agg(open=150.0 + i, timestamp=1609459200000 + i * 60000, transactions=100 + i) for i in range(5)
+        ]
+
+        mock_client = MagicMock()
+        mock_client.list_aggs.return_value = iter(mock_aggs)
+        provider.polygon_client = mock_client
+
+        df = provider.get_historical_data(
+            ticker="AAPL",
+            multiplier=1,
+            timespan="minute",
+            from_date="2021-01-01",
+            to_date="2021-01-02",
+            limit=2,
+        )
+
+        assert len(df) == 5  # noqa: PLR2004
+        assert list(df["open"]) == [150.0, 151.0, 152.0, 153.0, 154.0]
+        assert list(df["transactions"]) == [100, 101, 102, 103, 104]
+
     def test_cache_key_generation(self, provider: HistoricalDataProvider) -> None:
         """Test that cache keys are generated consistently."""
         key1 = provider._generate_cache_key(  # noqa: SLF001
@@ -181,7 +406,7 @@ class TestHistoricalDataProvider:
         # Different parameters should generate different key
         assert key1 != key3
         # Keys should be hex strings
-        assert len(key1) == 64  # noqa: PLR2004  # SHA256 produces 64 hex characters
+        assert len(key1) == 32  # noqa: PLR2004  # BLAKE2b-128 produces 32 hex characters
 
     def test_cache_saves_and_loads_data(self, provider: HistoricalDataProvider) -> None:
         """Test that data is saved to cache and loaded from cache."""
@@ -228,6 +453,268 @@ class TestHistoricalDataProvider:
         # DataFrames should be equal
         pd.testing.assert_frame_equal(df1, df2)
 
+    def test_large_response_cached_as_zstd_parquet(self, tmp_path: Path, make_agg: Callable[..., MagicMock]) -> None:
+        """Test that responses at or above feather_row_threshold are cached as zstd-compressed parquet."""
+        config = HistoricalDataProviderConfig(
+            polygon_api_key="test_key", cache_dir=tmp_path / "cache", feather_row_threshold=1
+        )
+        provider = HistoricalDataProvider(config=config)
+
+        mock_agg = make_agg()
+
+        mock_client = MagicMock()
+        mock_client.list_aggs.return_value = iter([mock_agg])
+        provider.polygon_client = mock_client
+
+        df1 = provider.get_historical_data(
+            ticker="AAPL",
+            multiplier=1,
+            timespan="day",
+            from_date="2021-01-01",
+            to_date="2021-01-02",
+        )
+
+        cache_files = _cache_files(config.cache_dir)
+        assert len(cache_files) == 1
+        assert cache_files[0].suffix == ".parquet"
+        metadata = pq.ParquetFile(cache_files[0]).metadata
+        assert metadata.row_group(0).column(0).compression == "ZSTD"
+
+        new_provider = HistoricalDataProvider(config=config)
+        new_provider.polygon_client = mock_client
+        df2 = new_provider.get_historical_data(
+            ticker="AAPL",
+            multiplier=1,
+            timespan="day",
+            from_date="2021-01-01",
+            to_date="2021-01-02",
+        )
+
+        assert mock_client.list_aggs.call_count == 1
+        pd.testing.assert_frame_equal(df1, df2)
+
+    def test_small_response_cached_as_feather(self, provider: HistoricalDataProvider, mock_client: MagicMock) -> None:
+        """Test that responses below feather_row_threshold are cached as Feather."""
+        provider.get_historical_data(
+            ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+        )
+
+        assert mock_client.list_aggs.call_count == 1
+        cache_files = _cache_files(provider.config.cache_dir)
+        assert len(cache_files) == 1
+        assert cache_files[0].suffix == ".feather"
+
+    def test_cache_files_are_sharded(self, provider: HistoricalDataProvider, mock_client: MagicMock) -> None:
+        """Test that cache files are stored in a subdirectory named after the cache key prefix."""
+        provider.get_historical_data(
+            ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+        )
+
+        cache_key = provider._generate_cache_key(  # noqa: SLF001
+            ticker="AAPL",
+            multiplier=1,
+            timespan="day",
+            from_date="2021-01-01",
+            to_date="2021-01-02",
+            adjusted=True,
+            sort="asc",
+            limit=50000,
+        )
+        assert mock_client.list_aggs.call_count == 1
+        assert _cache_files(provider.config.cache_dir) == [
+            provider.config.cache_dir / cache_key[:2] / f"{cache_key}.feather"
+        ]
+
+    def test_cache_loads_from_disk_in_new_provider(
+        self, provider: HistoricalDataProvider, mock_client: MagicMock, mock_config: HistoricalDataProviderConfig
+    ) -> None:
+        """Test that a new provider instance loads previously cached data from disk."""
+        df1 = provider.get_historical_data(
+            ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+        )
+
+        new_provider = HistoricalDataProvider(config=mock_config)
+        new_provider.polygon_client = mock_client
+        df2 = new_provider.get_historical_data(
+            ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+        )
+
+        assert mock_client.list_aggs.call_count == 1
+        pd.testing.assert_frame_equal(df1, df2)
+
+    def test_memory_cache_skips_disk(self, provider: HistoricalDataProvider, mock_client: MagicMock) -> None:
+        """Test that repeated calls are served from memory without reading the parquet file."""
+        df1 = provider.get_historical_data(
+            ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+        )
+        for cache_file in _cache_files(provider.config.cache_dir):
+            cache_file.unlink()
+
+        df2 = provider.get_historical_data(
+            ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+        )
+
+        assert mock_client.list_aggs.call_count == 1
+        pd.testing.assert_frame_equal(df1, df2)
+
+    def test_memory_cache_returns_copy(self, provider: HistoricalDataProvider, mock_client: MagicMock) -> None:
+        """Test that mutating a returned DataFrame does not affect the memory cache."""
+        df1 = provider.get_historical_data(
+            ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+        )
+        df1.loc[0, "open"] = 0.0
+        df1["extra"] = 1
+
+        df2 = provider.get_historical_data(
+            ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+        )
+
+        assert mock_client.list_aggs.call_count == 1
+        assert df2.iloc[0]["open"] == 150.0  # noqa: PLR2004
+        assert "extra" not in df2.columns
+
+    def test_memory_cache_returns_shallow_copy_under_copy_on_write(
+        self, provider: HistoricalDataProvider, mock_client: MagicMock
+    ) -> None:
+        """Test that with Copy-on-Write the memory cache shares buffers but stays isolated from callers."""
+        with pd.option_context("mode.copy_on_write", True):
+            provider.get_historical_data(
+                ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+            )
+            df = provider.get_historical_data(
+                ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+            )
+            (cached_df,) = provider._memory_cache.values()  # noqa: SLF001
+            assert np.shares_memory(df["open"].to_numpy(), cached_df["open"].to_numpy())
+
+            df.loc[0, "open"] = 0.0
+
+            assert mock_client.list_aggs.call_count == 1
+            assert cached_df.iloc[0]["open"] == 150.0  # noqa: PLR2004
+
+    def test_memory_cache_isolated_after_copy_on_write_is_disabled(
+        self, provider: HistoricalDataProvider, mock_client: MagicMock
+    ) -> None:
+        """Test that a DataFrame fetched under Copy-on-Write can be modified after disabling it."""
+        with pd.option_context("mode.copy_on_write", True):
+            df1 = provider.get_historical_data(
+                ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+            )
+        df1.loc[0, "open"] = 99.0
+
+        df2 = provider.get_historical_data(
+            ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+        )
+
+        assert mock_client.list_aggs.call_count == 1
+        assert df2.iloc[0]["open"] == 150.0  # noqa: PLR2004
+
+    def test_memory_cache_evicts_least_recently_used(self, tmp_path: Path) -> None:
+        """Test that the memory cache is bounded by memory_cache_size."""
+        config = HistoricalDataProviderConfig(
+            polygon_api_key="test_key", cache_dir=tmp_path / "cache", memory_cache_size=1
+        )
+        provider = HistoricalDataProvider(config=config)
+        mock_client = MagicMock()
+        mock_client.list_aggs.side_effect = lambda **_: iter([])
+        provider.polygon_client = mock_client
+
+        provider.get_historical_data(
+            ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+        )
+        provider.get_historical_data(
+            ticker="GOOGL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+        )
+
+        expected_key = provider._generate_cache_key(  # noqa: SLF001
+            ticker="GOOGL",
+            multiplier=1,
+            timespan="day",
+            from_date="2021-01-01",
+            to_date="2021-01-02",
+            adjusted=True,
+            sort="asc",
+            limit=50000,
+        )
+        assert list(provider._memory_cache) == [expected_key]  # noqa: SLF001
+
+    def test_get_historical_data_many(
+        self, provider: HistoricalDataProvider, make_agg: Callable[..., MagicMock]
+    ) -> None:
+        """Test fetching several tickers concurrently."""
+        prices = {"AAPL": 150.0, "GOOGL": 2800.0, "MSFT": 300.0}
+
+        def list_aggs(ticker: str, **_: object) -> Iterator[MagicMock]:
+            return iter([make_agg(open=prices[ticker])])
+
+        mock_client = MagicMock()
+        mock_client.list_aggs.side_effect = list_aggs
+        provider.polygon_client = mock_client
+
+        frames = provider.get_historical_data_many(
+            tickers=["AAPL", "GOOGL", "MSFT", "AAPL"],
+            multiplier=1,
+            timespan="day",
+            from_date="2021-01-01",
+            to_date="2021-01-02",
+            max_workers=3,
+        )
+
+        assert list(frames) == ["AAPL", "GOOGL", "MSFT"]
+        assert mock_client.list_aggs.call_count == 3  # noqa: PLR2004
+        for ticker, df in frames.items():
+            assert df.iloc[0]["open"] == prices[ticker]
+        cache_files = _cache_files(provider.config.cache_dir)
+        assert len(cache_files) == 3  # noqa: PLR2004
+        assert all(path.suffix == ".feather" for path in cache_files)
+
+    def test_get_historical_data_many_reuses_connections(
+        self, provider: HistoricalDataProvider, threaded_httpserver: HTTPServer, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        """Test that concurrent fetches through the shared client do not overflow its connection pool."""
+        threaded_httpserver.expect_request(re.compile(r"/v2/aggs/ticker/.*")).respond_with_json(
+            {
+                "status": "OK",
+                "results": [
+                    {"o": 150.0, "h": 152.0, "l": 149.0, "c": 151.0, "v": 1000000, "vw": 150.5, "t": 1609459200000}
+                ],
+            }
+        )
+        provider.polygon_client = RESTClient("test_key", base=threaded_httpserver.url_for("").rstrip("/"))
+
+        with caplog.at_level(logging.WARNING, logger="urllib3"):
+            frames = provider.get_historical_data_many(
+                tickers=[f"T{i}" for i in range(8)],
+                multiplier=1,
+                timespan="day",
+                from_date="2021-01-01",
+                to_date="2021-01-02",
+                max_workers=8,
+            )
+
+        assert len(frames) == 8  # noqa: PLR2004
+        assert not [record for record in caplog.records if "Connection pool is full" in record.getMessage()]
+
+    def test_cache_write_failure_leaves_no_files(
+        self, provider: HistoricalDataProvider, mock_client: MagicMock, mocker: MockerFixture
+    ) -> None:
+        """Test that an interrupted cache write leaves neither a partial cache file nor a temp file."""
+
+        def partial_write(_df: pd.DataFrame, path: Path, **_: object) -> None:
+            path.write_bytes(b"PAR1 truncated")
+            msg = "disk full"
+            raise OSError(msg)
+
+        mocker.patch.object(pd.DataFrame, "to_feather", autospec=True, side_effect=partial_write)
+
+        with pytest.raises(OSError, match="disk full"):
+            provider.get_historical_data(
+                ticker="AAPL", multiplier=1, timespan="day", from_date="2021-01-01", to_date="2021-01-02"
+            )
+
+        assert mock_client.list_aggs.call_count == 1
+        assert _cache_files(provider.config.cache_dir) == []
+
     def test_cache_disabled(self, tmp_path: Path) -> None:
         """Test that caching can be disabled."""
         config = HistoricalDataProviderConfig(polygon_api_key="test_key", cache_dir=tmp_path / "cache", use_cache=False)
@@ -271,7 +758,7 @@ class TestHistoricalDataProvider:
         assert mock_client.list_aggs.call_count == 2  # noqa: PLR2004
 
         # Verify no cache files were created
-        assert not (config.cache_dir).exists() or len(list(config.cache_dir.glob("*.parquet"))) == 0
+        assert not (config.cache_dir).exists() or len(_cache_files(config.cache_dir)) == 0
 
     def test_cache_directory_creation(self, tmp_path: Path) -> None:
         """Test that cache directory is created on initialization."""